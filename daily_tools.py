@@ -1,10 +1,14 @@
 import os
 import re
 import json
+import mmap
 import shutil
 import hashlib
 import datetime
-from dataclasses import dataclass
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional, Tuple
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -21,10 +25,20 @@ TASK_STATUS_MAP = {
 
 STATUS_TO_MARK = {v: k for k, v in TASK_STATUS_MAP.items()}
 
+# 按标记字符 ord 值直查的状态表，热循环里省掉 .lower() 分配和字典哈希
+_STATUS_LUT: List[Optional[str]] = [None] * 256
+for _mark, _status in TASK_STATUS_MAP.items():
+    _STATUS_LUT[ord(_mark[1])] = _status
+    _STATUS_LUT[ord(_mark[1].upper())] = _status
+
+
+def _mark_status(mark: str) -> str:
+    # mark 形如 '[x]'，正则已保证中间字符在 ASCII 范围内
+    return _STATUS_LUT[ord(mark[1])] or 'todo'
+
+# 标题行用 startswith 即可判定（锚定前缀无需正则）；任务行的括号标记保留正则，
+# 但先用 "'[' in line[:6]" 便宜地滤掉绝大多数非任务行再进正则引擎
 TASK_MARK_RE = re.compile(r"^\s*-\s*(\[(?: |x|~|!|>|\?)\])\s*(.*)$", re.IGNORECASE)
-H1_RE = re.compile(r"^#\s+")
-H2_RE = re.compile(r"^##\s+")
-H3_RE = re.compile(r"^###\s+")
 
 @dataclass
 class TaskItem:
@@ -43,6 +57,164 @@ class Section:
     end: int
 
 
+@dataclass
+class _ParsedFile:
+    """解析缓存条目：按 (mtime_ns, size) 校验新鲜度，避免每次工具调用都重读+重解析。"""
+    mtime_ns: int
+    size: int
+    lines: List[str]
+    sections: List[Section]
+    # 按 Section.start 索引该分节下的任务列表
+    tasks_by_section: Dict[int, List[TaskItem]] = field(default_factory=dict)
+    task_index: Dict[str, int] = field(default_factory=dict)
+
+
+# path -> _ParsedFile，LRU 上限防止跨月访问历史文件时无界增长
+_PARSE_CACHE: "OrderedDict[str, _ParsedFile]" = OrderedDict()
+_PARSE_CACHE_MAX = 64
+
+
+def _scan(lines: List[str]) -> Tuple[List[Section], Dict[int, List[TaskItem]], Dict[str, int]]:
+    """单次线性扫描，同时产出分节、各分节任务和 task_text -> 行号索引。
+
+    标题行用 startswith 前缀判断，任务行先经 '[' 快速过滤再进正则，
+    整个文件只走一趟。
+    """
+    sections: List[Section] = []
+    tasks_by_section: Dict[int, List[TaskItem]] = {}
+    task_index: Dict[str, int] = {}
+    current: Optional[Section] = None
+    current_sub: Optional[str] = None
+    current_tasks: Optional[List[TaskItem]] = None
+    for i, line in enumerate(lines):
+        if line.startswith('#'):
+            if line.startswith('## '):
+                if current:
+                    current.end = i - 1
+                    sections.append(current)
+                current = Section(title=line[3:].strip(), start=i, end=len(lines) - 1)
+                current_sub = None
+                current_tasks = tasks_by_section.setdefault(i, [])
+            elif line.startswith('### '):
+                current_sub = line[4:].strip()
+            continue
+        if '[' not in line[:6]:
+            continue
+        m = TASK_MARK_RE.match(line)
+        if not m:
+            continue
+        mark, text = m.group(1), m.group(2).strip()
+        if current_tasks is not None:
+            current_tasks.append(TaskItem(
+                line_index=i,
+                raw=line,
+                status_mark=mark,
+                status=_mark_status(mark),
+                text=text,
+                section=current.title,
+                subsection=current_sub,
+            ))
+        if text not in task_index:
+            task_index[text] = i
+    if current:
+        sections.append(current)
+    return sections, tasks_by_section, task_index
+
+
+# 超过该大小的文件改走只读 mmap：顺序扫描吃页缓存，且仅候选行才做 UTF-8 解码
+_MMAP_THRESHOLD = 64 * 1024
+
+
+def _scan_file(path: str):
+    """逐行流式扫描，产出 (line_index, kind, payload) 事件，不物化整个行列表。
+
+    kind 取值：'h2'/'h3'（payload 为标题文本）、'task'（payload 为
+    (mark, text, raw)）、'eof'（line_index 为总行数，用于闭合末尾分节）。
+    只读操作用它即可保持 O(1) 内存；需要改写的路径仍走 _get_parsed 的整列表。
+    大文件（>_MMAP_THRESHOLD）通过 mmap 按字节过滤，非候选行无需解码。
+    """
+    if os.stat(path).st_size > _MMAP_THRESHOLD:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                i = -1
+                for i, raw in enumerate(iter(mm.readline, b'')):
+                    if raw.startswith(b'#'):
+                        if raw.startswith(b'## '):
+                            yield i, 'h2', raw.decode('utf-8')[3:].strip()
+                        elif raw.startswith(b'### '):
+                            yield i, 'h3', raw.decode('utf-8')[4:].strip()
+                        continue
+                    if b'[' not in raw[:6]:
+                        continue
+                    line = raw.decode('utf-8').rstrip('\r\n')
+                    m = TASK_MARK_RE.match(line)
+                    if m:
+                        yield i, 'task', (m.group(1), m.group(2).strip(), line)
+                yield i + 1, 'eof', None
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        i = -1
+        for i, line in enumerate(f):
+            line = line.rstrip('\n')
+            if line.startswith('#'):
+                if line.startswith('## '):
+                    yield i, 'h2', line[3:].strip()
+                elif line.startswith('### '):
+                    yield i, 'h3', line[4:].strip()
+                continue
+            if '[' not in line[:6]:
+                continue
+            m = TASK_MARK_RE.match(line)
+            if m:
+                yield i, 'task', (m.group(1), m.group(2).strip(), line)
+        yield i + 1, 'eof', None
+
+
+def _store_parsed(path: str, parsed: _ParsedFile) -> None:
+    _PARSE_CACHE[path] = parsed
+    _PARSE_CACHE.move_to_end(path)
+    while len(_PARSE_CACHE) > _PARSE_CACHE_MAX:
+        _PARSE_CACHE.popitem(last=False)
+
+
+def _stat_or_none(path: str) -> Optional[os.stat_result]:
+    """一次 stat 同时回答"是否存在"和缓存新鲜度校验，省掉单独的 exists 探测。"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def _resolve_target(path: Optional[str]) -> Tuple[str, Optional[os.stat_result]]:
+    """解析目标文件（缺省为今日计划）并返回其 stat（None 表示不存在）。"""
+    if path is None:
+        y, m, d = _today_ymd()
+        path = os.path.join(DAILY_ROOT, y, m, f'{d}.md')
+    return path, _stat_or_none(path)
+
+
+def _get_parsed(path: str, st: Optional[os.stat_result] = None) -> _ParsedFile:
+    """读取并解析文件，命中缓存（mtime_ns/size 未变）时直接复用。"""
+    if st is None:
+        st = os.stat(path)
+    cached = _PARSE_CACHE.get(path)
+    if cached is not None and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+        _PARSE_CACHE.move_to_end(path)
+        return cached
+    lines = _load_file_lines(path)
+    sections, tasks_by_section, task_index = _scan(lines)
+    parsed = _ParsedFile(
+        mtime_ns=st.st_mtime_ns,
+        size=st.st_size,
+        lines=lines,
+        sections=sections,
+        tasks_by_section=tasks_by_section,
+        task_index=task_index,
+    )
+    _store_parsed(path, parsed)
+    return parsed
+
+
 def _today_ymd() -> Tuple[str, str, str]:
     now = datetime.datetime.now()
     return now.strftime('%Y'), now.strftime('%m'), now.strftime('%d')
@@ -54,7 +226,7 @@ def get_today_path() -> Dict[str, Any]:
     return {
         'date': f'{y}-{m}-{d}',
         'path': path,
-        'exists': os.path.exists(path)
+        'exists': _stat_or_none(path) is not None
     }
 
 
@@ -63,13 +235,41 @@ def _ensure_parents(file_path: str) -> None:
 
 
 def _load_file_lines(path: str) -> List[str]:
-    with open(path, 'r', encoding='utf-8') as f:
-        return f.read().splitlines()
+    # 二进制整读 + 一次性解码，绕开 TextIOWrapper 的增量解码和换行转换
+    with open(path, 'rb') as f:
+        return f.read().decode('utf-8').splitlines()
+
+
+# 串行化“读取→修改→写回”临界区：工具调用可能在多个线程并发执行
+# （mcp_server 用 gather + to_thread 跑工具），没有锁会互相丢写
+_WRITE_LOCK = threading.Lock()
 
 
 def _save_file_lines(path: str, lines: List[str]) -> None:
-    with open(path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(lines) + '\n')
+    # 先写临时文件再原子替换：崩溃时不会留下截断的半成品，也不会污染解析缓存；
+    # mkstemp 保证每个写入者有独立的临时文件名，并发替换不会互相踩踏
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    # 写入后原地刷新缓存，下次调用无需重读磁盘
+    st = os.stat(path)
+    sections, tasks_by_section, task_index = _scan(lines)
+    _store_parsed(path, _ParsedFile(
+        mtime_ns=st.st_mtime_ns,
+        size=st.st_size,
+        lines=lines,
+        sections=sections,
+        tasks_by_section=tasks_by_section,
+        task_index=task_index,
+    ))
 
 
 FALLBACK_TEMPLATE = """# 📅 今日计划
@@ -105,211 +305,335 @@ FALLBACK_TEMPLATE = """# 📅 今日计划
 
 """
 
+# 预先切分好的模板行，创建文件时不再重复 splitlines
+_FALLBACK_LINES: Tuple[str, ...] = tuple(FALLBACK_TEMPLATE.splitlines())
+
+
+# (year, month) -> (目录 mtime_ns, 已排序的 .md 文件名列表)
+_MONTH_LISTING_CACHE: Dict[Tuple[str, str], Tuple[int, List[str]]] = {}
+
+
+def _month_md_files(month_dir: str, y: str, m: str) -> List[str]:
+    """列出某月目录下已排序的 .md 文件，按目录 mtime 缓存结果。"""
+    try:
+        st = os.stat(month_dir)
+    except OSError:
+        return []
+    cached = _MONTH_LISTING_CACHE.get((y, m))
+    if cached is not None and cached[0] == st.st_mtime_ns:
+        return cached[1]
+    # scandir 复用枚举时拿到的元数据，省去逐文件 stat
+    with os.scandir(month_dir) as it:
+        md_files = sorted(e.name for e in it if e.name.endswith('.md') and e.is_file())
+    _MONTH_LISTING_CACHE[(y, m)] = (st.st_mtime_ns, md_files)
+    return md_files
+
 
 def _guess_template_source() -> Optional[str]:
     # 尝试优先复制最近一份已有的同月文件作为模板
-    info = get_today_path()
-    y, m, _ = info['date'].split('-')
+    y, m, _ = _today_ymd()
     month_dir = os.path.join(DAILY_ROOT, y, m)
-    if os.path.isdir(month_dir):
-        md_files = [f for f in os.listdir(month_dir) if f.endswith('.md')]
-        if md_files:
-            md_files.sort()
-            return os.path.join(month_dir, md_files[-1])
+    md_files = _month_md_files(month_dir, y, m)
+    if md_files:
+        return os.path.join(month_dir, md_files[-1])
     # 退化到上层 README.md 中的格式不可控，改用内置模板
     return None
 
 
 def create_today_from_template(force: bool = False) -> Dict[str, Any]:
-    info = get_today_path()
-    path = info['path']
-    if os.path.exists(path) and not force:
+    path, st = _resolve_target(None)
+    if st is not None and not force:
         return {'created': False, 'path': path, 'reason': 'exists'}
-    _ensure_parents(path)
-    src = _guess_template_source()
-    if src and os.path.exists(src):
-        content = '\n'.join(_load_file_lines(src)) + '\n'
-        # 简单规范化：替换首行标题为“今日计划”
-        lines = content.splitlines()
-        if lines and H1_RE.match(lines[0]):
-            lines[0] = '# 📅 今日计划'
-        _save_file_lines(path, lines)
-        return {'created': True, 'path': path, 'source': src}
-    else:
-        _save_file_lines(path, FALLBACK_TEMPLATE.splitlines())
-        return {'created': True, 'path': path, 'source': 'fallback'}
-
-
-def _parse_sections(lines: List[str]) -> List[Section]:
-    sections: List[Section] = []
-    current: Optional[Section] = None
-    for i, line in enumerate(lines):
-        if H2_RE.match(line):
-            if current:
-                current.end = i - 1
-                sections.append(current)
-            current = Section(title=line.strip().lstrip('#').strip(), start=i, end=len(lines)-1)
-    if current:
-        sections.append(current)
-    return sections
+    with _WRITE_LOCK:
+        _ensure_parents(path)
+        src = _guess_template_source()
+        if src and _stat_or_none(src) is not None:
+            content = '\n'.join(_load_file_lines(src)) + '\n'
+            # 简单规范化：替换首行标题为“今日计划”
+            lines = content.splitlines()
+            if lines and lines[0].startswith('# '):
+                lines[0] = '# 📅 今日计划'
+            _save_file_lines(path, lines)
+            return {'created': True, 'path': path, 'source': src}
+        else:
+            _save_file_lines(path, list(_FALLBACK_LINES))
+            return {'created': True, 'path': path, 'source': 'fallback'}
 
 
 def _section_range(lines: List[str], title_prefix: str) -> Optional[Tuple[int, int]]:
-    sec_list = _parse_sections(lines)
-    for sec in sec_list:
+    # 单趟扫描：命中目标分节后，遇到下一个 H2 立即返回，不构建全部 Section
+    start: Optional[int] = None
+    for i, line in enumerate(lines):
+        if line.startswith('## '):
+            if start is not None:
+                return start, i - 1
+            if line[3:].strip().startswith(title_prefix):
+                start = i
+    if start is not None:
+        return start, len(lines) - 1
+    return None
+
+
+def _section_lookup(sections: List[Section], title_prefix: str) -> Optional[Tuple[int, int]]:
+    """已有解析结果时直接在 Section 列表里找，不再扫描行。"""
+    for sec in sections:
         if sec.title.startswith(title_prefix):
             return sec.start, sec.end
     return None
 
 
-def _iter_tasks(lines: List[str], start: int, end: int, parent_title: str) -> List[TaskItem]:
-    results: List[TaskItem] = []
+def read_structured(path: Optional[str] = None) -> Dict[str, Any]:
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'exists': False, 'path': target}
+    # 缓存命中直接复用已解析结构
+    cached = _PARSE_CACHE.get(target)
+    if cached is not None and cached.mtime_ns == st.st_mtime_ns and cached.size == st.st_size:
+        _PARSE_CACHE.move_to_end(target)
+        payload = []
+        for sec in cached.sections:
+            tasks = cached.tasks_by_section.get(sec.start, [])
+            payload.append({
+                'title': sec.title,
+                'range': [sec.start, sec.end],
+                'tasks': [task.__dict__ for task in tasks]
+            })
+        return {'exists': True, 'path': target, 'sections': payload}
+    # 冷读：单次顺序流式扫描，峰值内存与文件大小无关
+    payload = []
+    current: Optional[Dict[str, Any]] = None
     current_sub: Optional[str] = None
-    for idx in range(start, end + 1):
-        line = lines[idx]
-        if H3_RE.match(line):
-            current_sub = line.strip().lstrip('#').strip()
-            continue
-        m = TASK_MARK_RE.match(line)
-        if m:
-            mark, text = m.group(1), m.group(2).strip()
-            status = TASK_STATUS_MAP.get(mark.lower(), 'todo')
-            results.append(TaskItem(
-                line_index=idx,
-                raw=line,
+    for i, kind, data in _scan_file(target):
+        if kind == 'h2' or kind == 'eof':
+            if current is not None:
+                current['range'][1] = i - 1
+            if kind == 'eof':
+                break
+            current = {'title': data, 'range': [i, -1], 'tasks': []}
+            current_sub = None
+            payload.append(current)
+        elif kind == 'h3':
+            current_sub = data
+        elif current is not None:
+            mark, text, raw = data
+            current['tasks'].append(TaskItem(
+                line_index=i,
+                raw=raw,
                 status_mark=mark,
-                status=status,
+                status=_mark_status(mark),
                 text=text,
-                section=parent_title,
+                section=current['title'],
                 subsection=current_sub,
-            ))
-    return results
-
-
-def read_structured(path: Optional[str] = None) -> Dict[str, Any]:
-    info = get_today_path() if path is None else {'path': path, 'exists': os.path.exists(path)}
-    if not info['exists']:
-        return {'exists': False, 'path': info['path'] if 'path' in info else path}
-    lines = _load_file_lines(info['path'])
-    sections = _parse_sections(lines)
-    payload: List[Dict[str, Any]] = []
-    for sec in sections:
-        tasks = _iter_tasks(lines, sec.start, sec.end, sec.title)
-        payload.append({
-            'title': sec.title,
-            'range': [sec.start, sec.end],
-            'tasks': [task.__dict__ for task in tasks]
-        })
+            ).__dict__)
     return {
         'exists': True,
-        'path': info['path'],
+        'path': target,
         'sections': payload
     }
 
 
-def _find_task_line(lines: List[str], task_text: str) -> Optional[int]:
+def _find_all_task_lines(lines: List[str], task_text: str) -> List[int]:
+    """同文本任务可能重复出现，返回全部行号（task_index 只记首个）。"""
+    results: List[int] = []
     for i, line in enumerate(lines):
         m = TASK_MARK_RE.match(line)
-        if not m:
-            continue
-        text = m.group(2).strip()
-        if text == task_text:
-            return i
-    return None
-
-
-def set_task_status(task_text: str, status: str, path: Optional[str] = None) -> Dict[str, Any]:
-    info = get_today_path() if path is None else {'path': path, 'exists': os.path.exists(path)}
-    if not info['exists']:
-        return {'updated': False, 'error': 'not_found', 'path': info['path']}
-    lines = _load_file_lines(info['path'])
-    idx = _find_task_line(lines, task_text)
-    if idx is None:
-        return {'updated': False, 'error': 'task_not_found'}
-    m = TASK_MARK_RE.match(lines[idx])
-    mark, text = m.group(1), m.group(2)
-    new_mark = STATUS_TO_MARK.get(status, '[ ]')
-    lines[idx] = f"- {new_mark} {text}"
-    _save_file_lines(info['path'], lines)
-    return {'updated': True, 'line': idx, 'new_status': status}
+        if m and m.group(2).strip() == task_text:
+            results.append(i)
+    return results
 
 
-def add_task(section_title_prefix: str, task_text: str, status: str = 'todo', path: Optional[str] = None) -> Dict[str, Any]:
-    info = get_today_path() if path is None else {'path': path, 'exists': os.path.exists(path)}
-    if not info['exists']:
-        return {'inserted': False, 'error': 'not_found', 'path': info['path']}
-    lines = _load_file_lines(info['path'])
-    rng = _section_range(lines, section_title_prefix)
-    if not rng:
-        return {'inserted': False, 'error': 'section_not_found'}
-    start, end = rng
+def _insert_point(lines: List[str], start: int, end: int) -> int:
+    # 向上回溯找到分节内最后一个非空行，其后即插入位置
     insert_at = end
-    # 向上回溯找到最后一个任务行后插入
     for i in range(end, start, -1):
         if lines[i].strip():
             insert_at = i + 1
             break
-    mark = STATUS_TO_MARK.get(status, '[ ]')
-    lines.insert(insert_at, f"- {mark} {task_text}")
-    _save_file_lines(info['path'], lines)
+    return insert_at
+
+
+class DailyFileEditor:
+    """批量编辑器：加载一次，内存中连续变更，退出时只写盘一次。
+
+    用法::
+
+        with edit(path) as ed:
+            ed.set_status('任务A', 'done')
+            ed.add_task('🎯', '任务B')
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lines: List[str] = list(_get_parsed(path).lines)
+        self._dirty = False
+
+    def __enter__(self) -> 'DailyFileEditor':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None and self._dirty:
+            _save_file_lines(self.path, self.lines)
+        return False
+
+    def set_status(self, task_text: str, status: str) -> Dict[str, Any]:
+        matches = _find_all_task_lines(self.lines, task_text)
+        if not matches:
+            return {'updated': False, 'error': 'task_not_found'}
+        idx = matches[0]
+        line = self.lines[idx]
+        i = line.find('[')
+        new_mark = STATUS_TO_MARK.get(status, '[ ]')
+        self.lines[idx] = line[:i] + new_mark + line[i + 3:]
+        self._dirty = True
+        result = {'updated': True, 'line': idx, 'new_status': status}
+        if len(matches) > 1:
+            # 同文本任务出现多处时只改首个，把其余行号告知调用方
+            result['duplicate_lines'] = matches[1:]
+        return result
+
+    def add_task(self, section_title_prefix: str, task_text: str, status: str = 'todo') -> Dict[str, Any]:
+        rng = _section_range(self.lines, section_title_prefix)
+        if not rng:
+            return {'inserted': False, 'error': 'section_not_found'}
+        insert_at = _insert_point(self.lines, *rng)
+        mark = STATUS_TO_MARK.get(status, '[ ]')
+        self.lines.insert(insert_at, f"- {mark} {task_text}")
+        self._dirty = True
+        return {'inserted': True, 'line': insert_at}
+
+    def append_note(self, section_title_prefix: str, note_line: str) -> Dict[str, Any]:
+        rng = _section_range(self.lines, section_title_prefix)
+        if not rng:
+            return {'appended': False, 'error': 'section_not_found'}
+        insert_at = _insert_point(self.lines, *rng)
+        self.lines.insert(insert_at, f"- {note_line}")
+        self._dirty = True
+        return {'appended': True, 'line': insert_at}
+
+
+def edit(path: Optional[str] = None) -> DailyFileEditor:
+    if path is None:
+        path = get_today_path()['path']
+    return DailyFileEditor(path)
+
+
+def batch_apply(operations: List[Dict[str, Any]], path: Optional[str] = None) -> Dict[str, Any]:
+    """在单个编辑事务内执行一组操作，整批只产生一次全文件写入。
+
+    operations 形如 [{'op': 'set_status'|'add_task'|'append_note', 'args': {...}}, ...]
+    """
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'applied': False, 'error': 'not_found', 'path': target}
+    results: List[Dict[str, Any]] = []
+    with _WRITE_LOCK, edit(target) as ed:
+        for op in operations:
+            name = op.get('op')
+            args = op.get('args', {}) or {}
+            if name == 'set_status':
+                results.append(ed.set_status(args.get('task_text'), args.get('status')))
+            elif name == 'add_task':
+                results.append(ed.add_task(args.get('section_title_prefix'), args.get('task_text'), args.get('status', 'todo')))
+            elif name == 'append_note':
+                results.append(ed.append_note(args.get('section_title_prefix'), args.get('note_line')))
+            else:
+                results.append({'error': f'unknown_op: {name}'})
+    return {'applied': True, 'results': results, 'path': target}
+
+
+def set_task_status(task_text: str, status: str, path: Optional[str] = None) -> Dict[str, Any]:
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'updated': False, 'error': 'not_found', 'path': target}
+    with _WRITE_LOCK:
+        parsed = _get_parsed(target)
+        idx = parsed.task_index.get(task_text)
+        lines = list(parsed.lines)
+        if idx is None:
+            return {'updated': False, 'error': 'task_not_found'}
+        # 标记固定是三字符 '[?]'，直接按 '[' 的位置切片替换，免去重新跑正则
+        line = lines[idx]
+        i = line.find('[')
+        new_mark = STATUS_TO_MARK.get(status, '[ ]')
+        # 写路径本就要整文件落盘，顺带扫一遍找出同文本的重复任务
+        matches = _find_all_task_lines(lines, task_text)
+        lines[idx] = line[:i] + new_mark + line[i + 3:]
+        _save_file_lines(target, lines)
+    result = {'updated': True, 'line': idx, 'new_status': status}
+    if len(matches) > 1:
+        result['duplicate_lines'] = [m for m in matches if m != idx]
+    return result
+
+
+def add_task(section_title_prefix: str, task_text: str, status: str = 'todo', path: Optional[str] = None) -> Dict[str, Any]:
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'inserted': False, 'error': 'not_found', 'path': target}
+    with _WRITE_LOCK:
+        parsed = _get_parsed(target)
+        lines = list(parsed.lines)
+        rng = _section_lookup(parsed.sections, section_title_prefix)
+        if not rng:
+            return {'inserted': False, 'error': 'section_not_found'}
+        insert_at = _insert_point(lines, *rng)
+        mark = STATUS_TO_MARK.get(status, '[ ]')
+        lines.insert(insert_at, f"- {mark} {task_text}")
+        _save_file_lines(target, lines)
     return {'inserted': True, 'line': insert_at}
 
 
 def append_note(section_title_prefix: str, note_line: str, path: Optional[str] = None) -> Dict[str, Any]:
-    info = get_today_path() if path is None else {'path': path, 'exists': os.path.exists(path)}
-    if not info['exists']:
-        return {'appended': False, 'error': 'not_found', 'path': info['path']}
-    lines = _load_file_lines(info['path'])
-    rng = _section_range(lines, section_title_prefix)
-    if not rng:
-        return {'appended': False, 'error': 'section_not_found'}
-    start, end = rng
-    insert_at = end
-    for i in range(end, start, -1):
-        if lines[i].strip():
-            insert_at = i + 1
-            break
-    # 追加为普通子弹
-    lines.insert(insert_at, f"- {note_line}")
-    _save_file_lines(info['path'], lines)
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'appended': False, 'error': 'not_found', 'path': target}
+    with _WRITE_LOCK:
+        parsed = _get_parsed(target)
+        lines = list(parsed.lines)
+        rng = _section_lookup(parsed.sections, section_title_prefix)
+        if not rng:
+            return {'appended': False, 'error': 'section_not_found'}
+        insert_at = _insert_point(lines, *rng)
+        # 追加为普通子弹
+        lines.insert(insert_at, f"- {note_line}")
+        _save_file_lines(target, lines)
     return {'appended': True, 'line': insert_at}
 
 
 def rollover_incomplete(path: Optional[str] = None) -> Dict[str, Any]:
-    info = get_today_path() if path is None else {'path': path, 'exists': os.path.exists(path)}
-    if not info['exists']:
-        return {'moved': 0, 'error': 'not_found', 'path': info['path']}
-    lines = _load_file_lines(info['path'])
-    tasks_to_move: List[str] = []
-    for line in lines:
-        m = TASK_MARK_RE.match(line)
-        if not m:
-            continue
-        mark, text = m.group(1), m.group(2).strip()
-        status = TASK_STATUS_MAP.get(mark.lower(), 'todo')
-        if status in ('todo', 'partial', 'in_progress'):
-            tasks_to_move.append(text)
-    # 创建明天文件
-    today = datetime.datetime.now()
-    tomorrow = today + datetime.timedelta(days=1)
-    y, m, d = tomorrow.strftime('%Y'), tomorrow.strftime('%m'), tomorrow.strftime('%d')
-    new_path = os.path.join(DAILY_ROOT, y, m, f'{d}.md')
-    if not os.path.exists(new_path):
-        _ensure_parents(new_path)
-        _save_file_lines(new_path, FALLBACK_TEMPLATE.splitlines())
-    # 将任务追加到“## 🎯 今日重点任务”末尾
-    new_lines = _load_file_lines(new_path)
-    rng = _section_range(new_lines, '🎯') or _section_range(new_lines, '今日重点任务')
-    if not rng:
-        # 若无该分节，追加到文件末尾
-        insert_at = len(new_lines)
-    else:
-        start, end = rng
-        insert_at = end + 1
-    for t in tasks_to_move:
-        new_lines.insert(insert_at, f"- [ ] {t}")
-        insert_at += 1
-    _save_file_lines(new_path, new_lines)
+    target, st = _resolve_target(path)
+    if st is None:
+        return {'moved': 0, 'error': 'not_found', 'path': target}
+    with _WRITE_LOCK:
+        # 源文件只需一次顺序扫描，流式读取即可
+        tasks_to_move: List[str] = []
+        for _i, kind, data in _scan_file(target):
+            if kind != 'task':
+                continue
+            mark, text, _raw = data
+            status = _mark_status(mark)
+            if status in ('todo', 'partial', 'in_progress'):
+                tasks_to_move.append(text)
+        # 创建明天文件
+        today = datetime.datetime.now()
+        tomorrow = today + datetime.timedelta(days=1)
+        y, m, d = tomorrow.strftime('%Y'), tomorrow.strftime('%m'), tomorrow.strftime('%d')
+        new_path = os.path.join(DAILY_ROOT, y, m, f'{d}.md')
+        if _stat_or_none(new_path) is None:
+            _ensure_parents(new_path)
+            _save_file_lines(new_path, list(_FALLBACK_LINES))
+        # 将任务追加到“## 🎯 今日重点任务”末尾
+        new_parsed = _get_parsed(new_path)
+        new_lines = list(new_parsed.lines)
+        rng = _section_lookup(new_parsed.sections, '🎯') or _section_lookup(new_parsed.sections, '今日重点任务')
+        if not rng:
+            # 若无该分节，追加到文件末尾
+            insert_at = len(new_lines)
+        else:
+            start, end = rng
+            insert_at = end + 1
+        # 一次切片拼接代替逐条 insert，避免每次插入都整体搬移后续行
+        new_lines[insert_at:insert_at] = [f"- [ ] {t}" for t in tasks_to_move]
+        _save_file_lines(new_path, new_lines)
     return {'moved': len(tasks_to_move), 'new_file_path': new_path}
 
 
@@ -1,8 +1,19 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+
+# orjson 序列化比标准库快数倍；未安装时退回 stdlib json
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as _DefaultResponse
+except ImportError:
+    orjson = None
+    from fastapi.responses import JSONResponse as _DefaultResponse
 from typing import List, Dict, Any, Optional
+import asyncio
 import json
 import logging
+import time
+import uuid
 from tools import mcp_tools
 from daily_tools import (
     get_today_path as dt_get_today_path,
@@ -12,6 +23,7 @@ from daily_tools import (
     set_task_status as dt_set_task_status,
     append_note as dt_append_note,
     rollover_incomplete as dt_rollover_incomplete,
+    batch_apply as dt_batch_apply,
 )
 from config import MCP_HOST, MCP_PORT, MCP_NAME, MCP_VERSION
 
@@ -22,25 +34,42 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title=MCP_NAME,
     version=MCP_VERSION,
-    description="本地MCP服务器，提供多种实用工具"
+    description="本地MCP服务器，提供多种实用工具",
+    default_response_class=_DefaultResponse
 )
 
+
+def _json_dumps(obj: Any) -> str:
+    # orjson 输出必为合法 UTF-8，无需 ensure_ascii
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
 # OpenAI Tools格式的数据模型
+# extra='ignore' 让未知字段直接跳过校验；模型本身不需要可变
 class Tool(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     type: str
     function: Dict[str, Any]
 
 class Message(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     role: str
     content: str
     tool_calls: Optional[List[Dict[str, Any]]] = None
 
 class ToolCall(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     id: str
     type: str
     function: Dict[str, Any]
 
 class ChatCompletionRequest(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     model: str
     messages: List[Message]
     tools: Optional[List[Tool]] = None
@@ -49,6 +78,8 @@ class ChatCompletionRequest(BaseModel):
     temperature: Optional[float] = 0.7
 
 class ChatCompletionResponse(BaseModel):
+    model_config = ConfigDict(extra='ignore', frozen=True)
+
     id: str
     object: str
     created: int
@@ -56,6 +87,10 @@ class ChatCompletionResponse(BaseModel):
     choices: List[Dict[str, Any]]
     usage: Dict[str, Any]
 
+# tool_calls 在 Message 里是原始字典列表；复用同一个 TypeAdapter 校验，
+# 避免每个请求重新解析 schema
+_TOOL_CALL_ADAPTER = TypeAdapter(List[ToolCall])
+
 # 定义可用的工具
 AVAILABLE_TOOLS = {
     "get_current_time": {
@@ -265,6 +300,32 @@ AVAILABLE_TOOLS = {
                 "required": []
             }
         }
+    },
+    "dp_batch_apply": {
+        "type": "function",
+        "function": {
+            "name": "dp_batch_apply",
+            "description": "在单次事务内批量执行多个计划变更操作（只写盘一次）",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "operations": {
+                        "type": "array",
+                        "description": "操作列表，每项形如 {op: set_status|add_task|append_note, args: {...}}",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "op": {"type": "string", "description": "操作名 set_status|add_task|append_note"},
+                                "args": {"type": "object", "description": "对应单条工具的参数"}
+                            },
+                            "required": ["op"]
+                        }
+                    },
+                    "path": {"type": "string", "description": "可选，明确文件路径；不传默认今日"}
+                },
+                "required": ["operations"]
+            }
+        }
     }
 }
 
@@ -290,40 +351,39 @@ async def chat_completions(request: ChatCompletionRequest):
     """处理聊天完成请求，支持工具调用"""
     try:
         logger.info(f"收到聊天请求: {request.model}")
-        
+
+        # 两个返回分支共用，只生成一次
+        response_id = "chatcmpl-" + uuid.uuid4().hex[:16]
+        created = int(time.time())
+
+
         # 检查是否有工具调用
         if request.tools and request.messages:
             last_message = request.messages[-1]
             
             # 检查是否需要工具调用
             if last_message.tool_calls:
-                # 处理工具调用
-                tool_results = []
-                
-                for tool_call in last_message.tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = tool_call.function.arguments
-                    
-                    if function_name in AVAILABLE_TOOLS:
-                        # 执行工具调用
-                        result = await execute_tool(function_name, function_args)
-                        tool_results.append({
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "content": json.dumps(result, ensure_ascii=False)
-                        })
-                    else:
-                        tool_results.append({
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "content": json.dumps({"error": f"未知工具: {function_name}"}, ensure_ascii=False)
-                        })
+                # 原始字典列表先过一次共享 TypeAdapter，再并发执行全部工具调用
+                # （execute_tool 对未知工具返回 error 字典）
+                tool_calls = _TOOL_CALL_ADAPTER.validate_python(last_message.tool_calls)
+                results = await asyncio.gather(*[
+                    execute_tool(tc.function.get("name", ""), tc.function.get("arguments", {}))
+                    for tc in tool_calls
+                ])
+                tool_results = [
+                    {
+                        "tool_call_id": tc.id,
+                        "role": "tool",
+                        "content": _json_dumps(result)
+                    }
+                    for tc, result in zip(tool_calls, results)
+                ]
                 
                 # 返回工具调用结果
                 return {
-                    "id": "chatcmpl-" + str(hash(str(request))),
+                    "id": response_id,
                     "object": "chat.completion",
-                    "created": 1234567890,
+                    "created": created,
                     "model": request.model,
                     "choices": [{
                         "index": 0,
@@ -345,9 +405,9 @@ async def chat_completions(request: ChatCompletionRequest):
         response_content = f"你好！我是{MCP_NAME}。我可以帮助你使用以下工具：{', '.join(AVAILABLE_TOOLS.keys())}"
         
         return {
-            "id": "chatcmpl-" + str(hash(str(request))),
+            "id": response_id,
             "object": "chat.completion",
-            "created": 1234567890,
+            "created": created,
             "model": request.model,
             "choices": [{
                 "index": 0,
@@ -368,6 +428,30 @@ async def chat_completions(request: ChatCompletionRequest):
         logger.error(f"处理聊天请求时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# 工具名 -> 参数适配调用，导入时构建一次；热路径上以 O(1) 哈希查找取代逐个字符串比较
+TOOL_DISPATCH: Dict[str, Any] = {
+    "get_current_time": lambda args: mcp_tools.get_current_time(),
+    "get_weather": lambda args: mcp_tools.get_weather(args.get("city", "北京")),
+    "calculate": lambda args: mcp_tools.calculate(args.get("expression", "")),
+    "translate_text": lambda args: mcp_tools.translate_text(args.get("text", ""), args.get("target_lang", "en")),
+    "get_file_info": lambda args: mcp_tools.get_file_info(args.get("file_path", "")),
+    "list_directory": lambda args: mcp_tools.list_directory(args.get("dir_path", ".")),
+    # === DailyPlan 工具 ===
+    "dp_get_today_path": lambda args: dt_get_today_path(),
+    "dp_create_today": lambda args: dt_create_today(force=bool(args.get("force", False))),
+    "dp_read_day": lambda args: dt_read_structured(path=args.get("path")),
+    "dp_add_task": lambda args: dt_add_task(
+        args.get("section_title_prefix"), args.get("task_text"),
+        status=args.get("status", "todo"), path=args.get("path")),
+    "dp_set_task_status": lambda args: dt_set_task_status(
+        args.get("task_text"), args.get("status"), path=args.get("path")),
+    "dp_append_note": lambda args: dt_append_note(
+        args.get("section_title_prefix"), args.get("note_line"), path=args.get("path")),
+    "dp_rollover_incomplete": lambda args: dt_rollover_incomplete(path=args.get("path")),
+    "dp_batch_apply": lambda args: dt_batch_apply(args.get("operations", []), path=args.get("path")),
+}
+
+
 async def execute_tool(function_name: str, arguments: str) -> Dict[str, Any]:
     """执行指定的工具"""
     try:
@@ -376,59 +460,15 @@ async def execute_tool(function_name: str, arguments: str) -> Dict[str, Any]:
             args = json.loads(arguments)
         else:
             args = arguments
-        
+
         logger.info(f"执行工具: {function_name}, 参数: {args}")
-        
-        # 根据工具名称调用相应的方法
-        if function_name == "get_current_time":
-            return mcp_tools.get_current_time()
-        elif function_name == "get_weather":
-            city = args.get("city", "北京")
-            return mcp_tools.get_weather(city)
-        elif function_name == "calculate":
-            expression = args.get("expression", "")
-            return mcp_tools.calculate(expression)
-        elif function_name == "translate_text":
-            text = args.get("text", "")
-            target_lang = args.get("target_lang", "en")
-            return mcp_tools.translate_text(text, target_lang)
-        elif function_name == "get_file_info":
-            file_path = args.get("file_path", "")
-            return mcp_tools.get_file_info(file_path)
-        elif function_name == "list_directory":
-            dir_path = args.get("dir_path", ".")
-            return mcp_tools.list_directory(dir_path)
-        # === DailyPlan 工具分发 ===
-        elif function_name == "dp_get_today_path":
-            return dt_get_today_path()
-        elif function_name == "dp_create_today":
-            force = args.get("force", False)
-            return dt_create_today(force=bool(force))
-        elif function_name == "dp_read_day":
-            path = args.get("path")
-            return dt_read_structured(path=path)
-        elif function_name == "dp_add_task":
-            section_title_prefix = args.get("section_title_prefix")
-            task_text = args.get("task_text")
-            status = args.get("status", "todo")
-            path = args.get("path")
-            return dt_add_task(section_title_prefix, task_text, status=status, path=path)
-        elif function_name == "dp_set_task_status":
-            task_text = args.get("task_text")
-            status = args.get("status")
-            path = args.get("path")
-            return dt_set_task_status(task_text, status, path=path)
-        elif function_name == "dp_append_note":
-            section_title_prefix = args.get("section_title_prefix")
-            note_line = args.get("note_line")
-            path = args.get("path")
-            return dt_append_note(section_title_prefix, note_line, path=path)
-        elif function_name == "dp_rollover_incomplete":
-            path = args.get("path")
-            return dt_rollover_incomplete(path=path)
-        else:
+
+        handler = TOOL_DISPATCH.get(function_name)
+        if handler is None:
             return {"error": f"未知工具: {function_name}"}
-            
+        # 工具实现均为同步代码（部分涉及磁盘I/O），统一放线程执行
+        return await asyncio.to_thread(handler, args)
+
     except Exception as e:
         logger.error(f"执行工具 {function_name} 时出错: {str(e)}")
         return {"error": f"工具执行失败: {str(e)}"}
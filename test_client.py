@@ -7,6 +7,14 @@ class MCPTestClient:
     
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
+        self._tools = None
+
+    def _get_tools_cached(self):
+        """从 /tools 拉取一次工具定义并缓存，避免在测试里重复手写字典"""
+        if self._tools is None:
+            data = self.test_get_tools()
+            self._tools = (data or {}).get("tools", [])
+        return self._tools
     
     def test_server_info(self):
         """测试服务器信·息"""
@@ -60,59 +68,16 @@ class MCPTestClient:
         """测试工具调用"""
         # 测试获取时间
         print("\n=== 测试工具调用 ===")
-        
-        # 获取时间工具
-        time_tool = {
-            "type": "function",
-            "function": {
-                "name": "get_current_time",
-                "description": "获取当前时间信息",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
-            }
-        }
-        
-        # 计算工具
-        calc_tool = {
-            "type": "function",
-            "function": {
-                "name": "calculate",
-                "description": "计算数学表达式",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "expression": {
-                            "type": "string",
-                            "description": "数学表达式"
-                        }
-                    },
-                    "required": ["expression"]
-                }
-            }
-        }
-        
-        # 天气工具
-        weather_tool = {
-            "type": "function",
-            "function": {
-                "name": "get_weather",
-                "description": "获取天气信息",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "city": {
-                            "type": "string",
-                            "description": "城市名称"
-                        }
-                    },
-                    "required": []
-                }
-            }
-        }
-        
+
+        # 直接复用服务器声明的工具定义，不再在这里重复维护三份字典
+        by_name = {t["function"]["name"]: t for t in self._get_tools_cached()}
+        time_tool = by_name.get("get_current_time")
+        calc_tool = by_name.get("calculate")
+        weather_tool = by_name.get("get_weather")
+        if not (time_tool and calc_tool and weather_tool):
+            print("无法从服务器获取工具定义，跳过工具调用测试")
+            return
+
         # 测试各种工具调用
         tools_to_test = [
             ([time_tool], "请告诉我现在的时间"),
@@ -1,11 +1,47 @@
+import ast
+import hashlib
 import json
+import operator
+import re
 import requests
 import datetime
 import os
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List, Generator
+from urllib3.util.retry import Retry
+
+# Numba 为可选依赖：装了就能把重复表达式编译成机器码，没装走 AST 解释
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# orjson 为可选依赖：SSE 热循环里直接在 bytes 上解析，缺失时退回标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 from config import BASE_URL, API_KEY, MODEL, CHAT_LOG_PATH, SYSTEM_PROMPT, CHAT_HISTORY_WINDOW
 
+# 模块级连接池：跨调用保持 TLS keep-alive，省掉每次 LLM 请求的握手。
+# 只在连接建立失败时做两次带退避的重试——这两处调用都是 POST，请求一旦
+# 发出就不能自动重发（非幂等，流式响应消费到一半更不行），所以不配置
+# 基于状态码/读错误的重试
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=0.3),
+)
+_SESSION.mount("https://", _adapter)
+_SESSION.mount("http://", _adapter)
+
 # 配置外部LLM API调用日志
 def setup_llm_logging():
     """设置LLM API调用日志"""
@@ -25,50 +61,236 @@ def setup_llm_logging():
 
 llm_logger = setup_llm_logging()
 
+def _tail_history_records(path: str, limit: int) -> List[Dict[str, str]]:
+    """从文件尾部按块回读 JSONL，凑够 limit 条有效消息即停。
+
+    工作量只与 limit 成正比，与日志文件总大小无关。
+    """
+    records: List[Dict[str, str]] = []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buf = b''
+        while pos > 0:
+            step = min(8192, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            if pos > 0 and limit > 0 and buf.count(b'\n') <= limit:
+                continue
+            lines = buf.split(b'\n')
+            if pos > 0:
+                # 首行可能在块边界被截断，丢弃；它会在下一轮读入时补全
+                lines = lines[1:]
+            records = []
+            for raw in lines:
+                raw = raw.strip()
+                if not raw:
+                    continue
+                try:
+                    obj = json.loads(raw)
+                except Exception:
+                    continue
+                if obj.get("role") in ("user", "assistant"):
+                    records.append({"role": obj["role"], "content": obj.get("content", "")})
+            if pos == 0 or (limit > 0 and len(records) >= limit):
+                break
+    if limit > 0:
+        records = records[-limit:]
+    return records
+
+# 进程内最近消息环形缓冲：启动时从日志尾部预热一次，此后由
+# record_recent_message 在每次写日志时同步追加，热路径不再回读磁盘。
+RECENT_MSGS: "deque[Dict[str, str]]" = deque(maxlen=CHAT_HISTORY_WINDOW)
+_RECENT_LOCK = threading.Lock()
+
+try:
+    RECENT_MSGS.extend(_tail_history_records(CHAT_LOG_PATH, CHAT_HISTORY_WINDOW))
+except OSError:
+    pass
+
+# 系统提示在进程生命周期内不变，构造一次复用，而不是每次请求新建 dict
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT} if SYSTEM_PROMPT else None
+
+def _prompt_cache_key(messages: List[Dict[str, str]]) -> str:
+    """对共享前缀（system + 历史，不含当前用户消息）求稳定哈希。
+
+    作为 OpenAI 的 prompt_cache_key 提示传给服务端，前缀相同的请求可以
+    复用服务端 KV 缓存；不支持该字段的端点会直接忽略。
+    """
+    prefix = json.dumps(messages[:-1], ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(prefix).hexdigest()
+
+def record_recent_message(role: str, content: str) -> None:
+    """追加一条消息到环形缓冲，由写日志方在落盘后调用。"""
+    with _RECENT_LOCK:
+        RECENT_MSGS.append({"role": role, "content": content})
+
+# calculate 的字符白名单，编译一次；C 层匹配代替逐字符 set 查找
+_ALLOWED_RE = re.compile(r'^[\d+\-*/.() ]*$')
+
+# calculate 支持的算术节点 -> 对应运算，AST 求值不经过 eval
+_ALLOWED_BINOPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_ALLOWED_UNARYOPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# 乘方指数上限：eval 时代 9**9**9 这类表达式会把进程算死，这里直接拒绝
+_MAX_EXPONENT = 512
+
+def _eval_node(node):
+    """递归求值表达式 AST，只接受数字常量与四则运算（及有界乘方）。"""
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _ALLOWED_BINOPS:
+        left = _eval_node(node.left)
+        right = _eval_node(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > _MAX_EXPONENT:
+            raise ValueError("指数过大")
+        return _ALLOWED_BINOPS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _ALLOWED_UNARYOPS:
+        return _ALLOWED_UNARYOPS[type(node.op)](_eval_node(node.operand))
+    raise ValueError("不支持的表达式")
+
+@lru_cache(maxsize=512)
+def _compile_expr(expression: str):
+    """把表达式解析成可复用的求值闭包，重复表达式免去重新解析。"""
+    tree = ast.parse(expression, mode="eval")
+    return lambda: _eval_node(tree)
+
+def _check_node(node) -> None:
+    """只校验不求值：确认 AST 全部落在 calculate 的白名单节点内。"""
+    if isinstance(node, ast.Expression):
+        _check_node(node.body)
+    elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        pass
+    elif isinstance(node, ast.BinOp) and type(node.op) in _ALLOWED_BINOPS:
+        _check_node(node.left)
+        _check_node(node.right)
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in _ALLOWED_UNARYOPS:
+        _check_node(node.operand)
+    else:
+        raise ValueError("不支持的表达式")
+
+# 表达式源码 -> Numba 编译结果（编译/校验失败缓存 None，避免反复重试）
+_NJIT_CACHE: Dict[str, Any] = {}
+# 表达式出现次数：JIT 一个新表达式要数百毫秒，只对重复出现的表达式编译
+_EXPR_HITS: Dict[str, int] = {}
+_NJIT_MIN_HITS = 3
+
+def _extract_stream_content(payload):
+    """从单帧 SSE JSON（bytes 或 str）里取出增量文本，兼容 delta 与 message 两种格式。"""
+    try:
+        obj = _json_loads(payload)
+    except Exception:
+        return None
+    choices = obj.get('choices')
+    choice = choices[0] if choices else {}
+    chunk = choice.get('delta', {}).get('content')
+    if chunk:
+        return chunk
+    return choice.get('message', {}).get('content') or None
+
+def _njit_expr(expression: str):
+    """返回表达式的 Numba 编译版本；不满足条件时返回 None 走 AST 解释。
+
+    同一表达式出现满 _NJIT_MIN_HITS 次才触发编译，冷表达式不在请求
+    路径上付 JIT 成本。编译在此处强制完成并与 AST 解释器结果比对：
+    numba 的 int64 会静默溢出、超范围常量要到首次调用才抛 TypingError，
+    两种情况都在这里被发现并缓存 None，保证 calculate 的结果始终与
+    解释器一致。
+    """
+    if njit is None:
+        return None
+    if expression in _NJIT_CACHE:
+        return _NJIT_CACHE[expression]
+    if len(_EXPR_HITS) > 4096:
+        _EXPR_HITS.clear()
+    hits = _EXPR_HITS.get(expression, 0) + 1
+    _EXPR_HITS[expression] = hits
+    if hits < _NJIT_MIN_HITS:
+        return None
+    compiled = None
+    try:
+        # exec 的源码由我们自己拼接，且 AST 已过白名单校验
+        _check_node(ast.parse(expression, mode="eval"))
+        ns: Dict[str, Any] = {}
+        exec(compile("def _f():\n    return " + expression, "<calc>", "exec"), {}, ns)
+        candidate = njit(cache=True)(ns["_f"])
+        # 调用一次强制编译，并以 AST 的精确结果做一致性校验
+        if candidate() == _compile_expr(expression)():
+            compiled = candidate
+    except Exception:
+        compiled = None
+    _NJIT_CACHE[expression] = compiled
+    return compiled
+
+# call_openai_api 的响应缓存参数：短 TTL 主要吸收重试和重复点击
+_RESP_CACHE_MAX = 1024
+_RESP_CACHE_TTL = 300.0
+
 class MCPTools:
     """MCP工具集合"""
-    
+
     def __init__(self):
         self.base_url = BASE_URL
         self.api_key = API_KEY
         self.model = MODEL
-    
+        # (model, max_tokens, prompt) -> (过期时刻, 结果)，LRU 淘汰
+        self._resp_cache: "OrderedDict[Any, Any]" = OrderedDict()
+        self._resp_cache_lock = threading.Lock()
+
+    def _resp_cache_get(self, key):
+        with self._resp_cache_lock:
+            entry = self._resp_cache.get(key)
+            if entry is None:
+                return None
+            expires_at, result = entry
+            if expires_at < time.monotonic():
+                del self._resp_cache[key]
+                return None
+            self._resp_cache.move_to_end(key)
+            return result
+
+    def _resp_cache_put(self, key, result):
+        with self._resp_cache_lock:
+            self._resp_cache[key] = (time.monotonic() + _RESP_CACHE_TTL, result)
+            self._resp_cache.move_to_end(key)
+            while len(self._resp_cache) > _RESP_CACHE_MAX:
+                self._resp_cache.popitem(last=False)
+
     def _load_recent_history(self, limit: int) -> List[Dict[str, str]]:
-        """读取最近 limit 条历史消息，转换为 OpenAI messages 结构。"""
-        messages: List[Dict[str, str]] = []
-        try:
-            if not os.path.exists(CHAT_LOG_PATH):
-                return messages
-            lines: List[Dict[str, Any]] = []
-            with open(CHAT_LOG_PATH, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = json.loads(line)
-                        role = obj.get("role")
-                        content = obj.get("content", "")
-                        if role in ("user", "assistant"):
-                            lines.append({"role": role, "content": content})
-                    except Exception:
-                        continue
-            if limit > 0:
-                lines = lines[-limit:]
-            # 直接返回 role/content 对
-            messages.extend(lines)
-        except Exception as e:
-            llm_logger.error(f"读取历史失败: {e}")
-        return messages
+        """读取最近 limit 条历史消息，转换为 OpenAI messages 结构。
+
+        本进程是日志的唯一写入方，直接从内存环形缓冲取，不碰磁盘。
+        """
+        with _RECENT_LOCK:
+            records = list(RECENT_MSGS)
+        if limit > 0:
+            records = records[-limit:]
+        return records
     
     def _build_messages(self, current_user_text: str) -> List[Dict[str, str]]:
         """构造发送给大模型的 messages: system + 最近历史 + 当前用户。"""
         messages: List[Dict[str, str]] = []
         # system
-        if SYSTEM_PROMPT:
-            messages.append({"role": "system", "content": SYSTEM_PROMPT})
+        if _SYSTEM_MSG is not None:
+            messages.append(_SYSTEM_MSG)
         # history (最近N条记录)
         recent = self._load_recent_history(CHAT_HISTORY_WINDOW)
+        # 当前用户消息在请求入口就已写入环形缓冲，若历史结尾就是这条，
+        # 丢掉它，避免同一条消息在 payload 里出现两次
+        if recent and recent[-1].get("role") == "user" and recent[-1].get("content") == current_user_text:
+            recent.pop()
         messages.extend(recent)
         # current user
         messages.append({"role": "user", "content": current_user_text})
@@ -97,10 +319,12 @@ class MCPTools:
     def calculate(self, expression: str) -> Dict[str, Any]:
         """计算数学表达式"""
         try:
-            allowed_chars = set('0123456789+-*/.() ')
-            if not all(c in allowed_chars for c in expression):
+            if not _ALLOWED_RE.match(expression):
                 return {"error": "表达式包含不允许的字符"}
-            result = eval(expression)
+            # LLM 传来的参数常带零散空白，ast.parse 不像 eval 那样容忍缩进
+            expression = expression.strip()
+            fn = _njit_expr(expression)
+            result = fn() if fn is not None else _compile_expr(expression)()
             return {
                 "expression": expression,
                 "result": result,
@@ -157,46 +381,58 @@ class MCPTools:
     def list_directory(self, dir_path: str = ".") -> Dict[str, Any]:
         """列出目录内容"""
         try:
-            if os.path.exists(dir_path) and os.path.isdir(dir_path):
-                items = os.listdir(dir_path)
-                files = []
-                directories = []
-                for item in items:
-                    item_path = os.path.join(dir_path, item)
-                    if os.path.isfile(item_path):
-                        files.append(item)
-                    elif os.path.isdir(item_path):
-                        directories.append(item)
-                return {
-                    "directory": dir_path,
-                    "files": files,
-                    "directories": directories,
-                    "total_files": len(files),
-                    "total_directories": len(directories)
-                }
-            else:
+            files = []
+            directories = []
+            # scandir 的 DirEntry 自带类型信息：普通条目零额外 stat，
+            # 只有真正的符号链接才为跟随目标多付一次 stat（与原先
+            # isfile/isdir 的跟随语义一致，链接仍按目标类型归类）
+            try:
+                with os.scandir(dir_path) as it:
+                    for entry in it:
+                        if entry.is_file():
+                            files.append(entry.name)
+                        elif entry.is_dir():
+                            directories.append(entry.name)
+            except (NotADirectoryError, FileNotFoundError):
                 return {
                     "directory": dir_path,
                     "error": "目录不存在或不是目录"
                 }
+            return {
+                "directory": dir_path,
+                "files": files,
+                "directories": directories,
+                "total_files": len(files),
+                "total_directories": len(directories)
+            }
         except Exception as e:
             return {
                 "directory": dir_path,
                 "error": f"列出目录失败: {str(e)}"
             }
     
-    def call_openai_api(self, prompt: str, max_tokens: int = 100) -> Dict[str, Any]:
-        """调用OpenAI API"""
-        start_time = datetime.datetime.now()
-        
+    def call_openai_api(self, prompt: str, max_tokens: int = 100, no_cache: bool = False) -> Dict[str, Any]:
+        """调用OpenAI API；相同请求在 TTL 内直接命中本地缓存"""
+        # 缓存键必须覆盖完整 messages：同一句"继续"在不同历史下答案不同，
+        # 只按 prompt 命中会把旧上下文的回复原样重放
+        messages = self._build_messages(prompt)
+        digest = hashlib.sha1(json.dumps(messages, ensure_ascii=False).encode('utf-8')).hexdigest()
+        cache_key = (self.model, max_tokens, digest)
+        if not no_cache:
+            hit = self._resp_cache_get(cache_key)
+            if hit is not None:
+                llm_logger.info("响应缓存命中，跳过LLM调用")
+                return dict(hit)
+
+        # 耗时用单调时钟；墙钟时间由日志格式器的 %(asctime)s 提供
+        t0 = time.perf_counter()
+
         # 记录请求信息
         llm_logger.info(f"=== 外部LLM API调用 ===")
-        llm_logger.info(f"调用时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         llm_logger.info(f"API端点: {self.base_url}/chat/completions")
-        llm_logger.info(f"请求方法: POST")
-        llm_logger.info(f"请求头: {json.dumps({'Authorization': 'Bearer ***', 'Content-Type': 'application/json', 'Accept-Charset': 'utf-8'}, ensure_ascii=False)}")
         llm_logger.info(f"请求参数: model={self.model}, max_tokens={max_tokens}")
-        llm_logger.info(f"请求内容: {prompt}")
+        # 请求原文只在 DEBUG 级别记录，%s 惰性格式化，关掉时零开销
+        llm_logger.debug("请求内容: %s", prompt)
         
         try:
             headers = {
@@ -206,11 +442,12 @@ class MCPTools:
             }
             data = {
                 "model": self.model,
-                "messages": self._build_messages(prompt),
-                "max_tokens": max_tokens
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "prompt_cache_key": _prompt_cache_key(messages)
             }
-            
-            response = requests.post(
+
+            response = _SESSION.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -220,31 +457,32 @@ class MCPTools:
             # 强制按UTF-8解码
             response.encoding = 'utf-8'
             
-            end_time = datetime.datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
+            duration = time.perf_counter() - t0
+
             # 记录响应信息
             llm_logger.info(f"=== 外部LLM API响应 ===")
-            llm_logger.info(f"响应时间: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
             llm_logger.info(f"响应状态码: {response.status_code}")
-            llm_logger.info(f"响应头: {dict(response.headers)}")
-            llm_logger.info(f"响应内容: {response.text}")
+            llm_logger.debug("响应头: %s", response.headers)
+            llm_logger.debug("响应内容: %s", response.text)
             llm_logger.info(f"请求耗时: {duration:.3f}秒")
-            
+
             if response.status_code == 200:
                 # 使用UTF-8文本进行解析，避免误判编码
                 try:
                     result = json.loads(response.text)
                 except Exception:
                     result = response.json()
-                llm_logger.info(f"解析后的响应: {json.dumps(result, ensure_ascii=False, indent=2)}")
+                if llm_logger.isEnabledFor(logging.DEBUG):
+                    llm_logger.debug("解析后的响应: %s", json.dumps(result, ensure_ascii=False))
                 llm_logger.info(f"---")
                 
-                return {
+                out = {
                     "success": True,
                     "response": result["choices"][0]["message"]["content"],
                     "usage": result.get("usage", {})
                 }
+                self._resp_cache_put(cache_key, out)
+                return dict(out)
             else:
                 llm_logger.error(f"API调用失败: {response.status_code}")
                 llm_logger.error(f"错误响应: {response.text}")
@@ -256,11 +494,9 @@ class MCPTools:
                     "response_text": response.text
                 }
         except Exception as e:
-            end_time = datetime.datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
+            duration = time.perf_counter() - t0
+
             llm_logger.error(f"=== 外部LLM API异常 ===")
-            llm_logger.error(f"异常时间: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
             llm_logger.error(f"异常信息: {str(e)}")
             llm_logger.error(f"请求耗时: {duration:.3f}秒")
             llm_logger.info(f"---")
@@ -272,16 +508,13 @@ class MCPTools:
 
     def stream_openai_api(self, prompt: str, max_tokens: int = 300) -> Generator[str, None, None]:
         """流式调用，按增量content产出文本块"""
-        start_time = datetime.datetime.now()
-        
+        t0 = time.perf_counter()
+
         # 记录请求信息
         llm_logger.info(f"=== 外部LLM流式API调用 ===")
-        llm_logger.info(f"调用时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         llm_logger.info(f"API端点: {self.base_url}/chat/completions")
-        llm_logger.info(f"请求方法: POST (Stream)")
-        llm_logger.info(f"请求头: {json.dumps({'Authorization': 'Bearer ***', 'Content-Type': 'application/json', 'Accept-Charset': 'utf-8'}, ensure_ascii=False)}")
         llm_logger.info(f"请求参数: model={self.model}, max_tokens={max_tokens}, stream=True")
-        llm_logger.info(f"请求内容: {prompt}")
+        llm_logger.debug("请求内容: %s", prompt)
         
         try:
             headers = {
@@ -289,14 +522,16 @@ class MCPTools:
                 "Content-Type": "application/json",
                 "Accept-Charset": "utf-8"
             }
+            messages = self._build_messages(prompt)
             data = {
                 "model": self.model,
-                "messages": self._build_messages(prompt),
+                "messages": messages,
                 "max_tokens": max_tokens,
-                "stream": True
+                "stream": True,
+                "prompt_cache_key": _prompt_cache_key(messages)
             }
             
-            with requests.post(
+            with _SESSION.post(
                 f"{self.base_url}/chat/completions",
                 headers=headers,
                 json=data,
@@ -305,54 +540,63 @@ class MCPTools:
             ) as r:
                 r.raise_for_status()
                 
+                # 原始数据块只在 DEBUG 级别留存，INFO 模式下不随响应体增长
+                debug_enabled = llm_logger.isEnabledFor(logging.DEBUG)
                 raw_chunks = []
-                # 按字节读取并手动UTF-8解码，避免错码
-                for raw in r.iter_lines(decode_unicode=False):
-                    if not raw:
+                # 按固定大小读字节块，在复用的 bytearray 上用 find(b'\n')
+                # 切行，省掉 iter_lines 的逐行对象分配；最后统一UTF-8解码
+                buf = bytearray()
+                done = False
+                for data_chunk in r.iter_content(chunk_size=4096):
+                    if not data_chunk:
                         continue
-                    line = raw.strip()
-                    if line.startswith(b'data: '):
-                        payload_bytes = line[len(b'data: '):].strip()
-                    else:
-                        payload_bytes = line
-                    if payload_bytes == b'[DONE]':
-                        break
-                    payload = payload_bytes.decode('utf-8', errors='replace')
-                    try:
-                        obj = json.loads(payload)
-                        delta = obj.get('choices', [{}])[0].get('delta', {})
-                        chunk = delta.get('content')
-                        if chunk:
-                            raw_chunks.append(payload)
-                            yield chunk
-                    except Exception:
-                        # 尝试兼容不同供应商流格式
-                        try:
-                            obj = json.loads(payload)
-                            text = obj.get('choices', [{}])[0].get('message', {}).get('content')
-                            if text:
-                                raw_chunks.append(payload)
-                                yield text
-                        except Exception:
+                    buf += data_chunk
+                    while not done:
+                        idx = buf.find(b'\n')
+                        if idx < 0:
+                            break
+                        line = bytes(buf[:idx]).strip()
+                        del buf[:idx + 1]
+                        if not line:
                             continue
+                        if line.startswith(b'data: '):
+                            payload_bytes = line[6:].strip()
+                        else:
+                            payload_bytes = line
+                        if payload_bytes == b'[DONE]':
+                            done = True
+                            break
+                        # 解析直接吃 bytes，只有 DEBUG 留存时才解码成 str
+                        text = _extract_stream_content(payload_bytes)
+                        if text:
+                            if debug_enabled:
+                                raw_chunks.append(payload_bytes.decode('utf-8', errors='replace'))
+                            yield text
+                    if done:
+                        break
+                if not done and buf:
+                    # 流在最后一帧后没有换行就结束了，补处理残留部分
+                    line = bytes(buf).strip()
+                    if line.startswith(b'data: '):
+                        line = line[6:].strip()
+                    if line and line != b'[DONE]':
+                        text = _extract_stream_content(line)
+                        if text:
+                            yield text
                 
-                end_time = datetime.datetime.now()
-                duration = (end_time - start_time).total_seconds()
-                
+                duration = time.perf_counter() - t0
+
                 # 记录响应信息
                 llm_logger.info(f"=== 外部LLM流式API响应 ===")
-                llm_logger.info(f"响应时间: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
                 llm_logger.info(f"响应状态: 200 OK (Stream)")
-                llm_logger.info(f"原始流式数据块: {raw_chunks}")
+                llm_logger.debug("原始流式数据块: %s", raw_chunks)
                 llm_logger.info(f"请求耗时: {duration:.3f}秒")
                 llm_logger.info(f"---")
                 
         except Exception as e:
-            end_time = datetime.datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
+            duration = time.perf_counter() - t0
+
             llm_logger.error(f"=== 外部LLM流式API异常 ===")
-            llm_logger.error(f"异常时间: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
             llm_logger.error(f"异常信息: {str(e)}")
             llm_logger.error(f"请求耗时: {duration:.3f}秒")
             llm_logger.info(f"---")
@@ -365,16 +609,13 @@ class MCPTools:
                     content = result.get('response', '抱歉，我无法回复你的消息。')
                 else:
                     content = f"API调用失败: {result.get('error', '未知错误')}"
-                # 模拟流式输出，每次输出几个字符
+                # 按词切块输出，保持前端的流式渲染路径不变
                 words = content.split()
                 for i, word in enumerate(words):
                     if i == 0:
                         yield word
                     else:
                         yield ' ' + word
-                    # 添加小延迟模拟流式效果
-                    import time
-                    time.sleep(0.05)
             except Exception as fallback_error:
                 yield f"抱歉，API调用失败: {str(fallback_error)}"
 
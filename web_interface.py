@@ -2,11 +2,28 @@ from fastapi import FastAPI, Request, Form
 from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import asyncio
+import atexit
 import json
 import os
 import logging
+import queue
+import threading
 from datetime import datetime
-from tools import mcp_tools
+from tools import mcp_tools, record_recent_message
+
+# orjson 为可选依赖：流式与日志热路径用它序列化，缺失时退回标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+_json_loads = orjson.loads if orjson is not None else json.loads
 from config import MCP_NAME, MCP_VERSION, CHAT_LOG_PATH
 import daily_tools as dt
 
@@ -50,65 +67,95 @@ app = FastAPI(
 # 聊天记录：确保目录存在
 os.makedirs(os.path.dirname(CHAT_LOG_PATH), exist_ok=True)
 
-def append_chat_log(role: str, content: str):
-    """将单条消息追加写入 JSONL 聊天日志。"""
+# 聊天日志异步落盘：请求路径只投递队列，后台线程攒批写文件
+_LOG_Q: queue.Queue = queue.Queue()
+_LOG_BATCH_MAX = 32
+_LOG_FLUSH_INTERVAL = 0.05
+
+def _drain_log_queue(block: bool):
+    """取出一批待写记录：最多 _LOG_BATCH_MAX 条，最多等 50ms。"""
+    batch = []
+    try:
+        if block:
+            batch.append(_LOG_Q.get(timeout=_LOG_FLUSH_INTERVAL))
+        while len(batch) < _LOG_BATCH_MAX:
+            batch.append(_LOG_Q.get_nowait())
+    except queue.Empty:
+        pass
+    return batch
+
+def _write_log_batch(batch):
+    if not batch:
+        return
     try:
-        record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "role": role,
-            "content": content,
-        }
         with open(CHAT_LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.write("\n".join(_json_dumps(r) for r in batch) + "\n")
     except Exception as e:
         app_logger.error(f"写入聊天记录失败: {e}")
 
+def _log_worker():
+    while True:
+        _write_log_batch(_drain_log_queue(block=True))
+
+threading.Thread(target=_log_worker, daemon=True, name="chat-log-writer").start()
+
+@atexit.register
+def _flush_chat_log():
+    """进程退出前把队列里剩余的记录落盘。"""
+    while True:
+        batch = _drain_log_queue(block=False)
+        if not batch:
+            break
+        _write_log_batch(batch)
+
+def append_chat_log(role: str, content: str):
+    """将单条消息投递到后台写入队列，并同步更新内存环形缓冲。"""
+    _LOG_Q.put({
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "role": role,
+        "content": content,
+    })
+    # 环形缓冲保持同步更新，后续请求立刻能看到这条历史
+    record_recent_message(role, content)
+
+# 静态资源类路径不走访问日志，省掉每个文件请求的日志开销
+_LOG_SKIP_PREFIXES = ("/static", "/logs")
+
 # 添加中间件记录所有HTTP请求和响应
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """记录所有HTTP请求和响应的中间件"""
+    """记录HTTP请求和响应的中间件（不读取请求体，避免复制上传内容）"""
+    path = request.url.path
+    if path.startswith(_LOG_SKIP_PREFIXES):
+        return await call_next(request)
+
     start_time = datetime.now()
-    
-    # 记录请求信息
-    app_logger.info(f"=== HTTP请求 ===")
-    app_logger.info(f"请求时间: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    app_logger.info(f"请求方法: {request.method}")
-    app_logger.info(f"请求路径: {request.url.path}")
-    app_logger.info(f"请求查询参数: {dict(request.query_params)}")
-    app_logger.info(f"请求头: {dict(request.headers)}")
-    
-    # 如果是POST请求，尝试记录请求体
-    if request.method == "POST":
-        try:
-            body = await request.body()
-            if body:
-                app_logger.info(f"请求体: {body.decode('utf-8')}")
-        except Exception as e:
-            app_logger.info(f"请求体读取失败: {e}")
-    
+    app_logger.info("HTTP请求: %s %s 查询参数=%s", request.method, path, dict(request.query_params))
+    app_logger.debug("请求头: %s", request.headers)
+
     # 处理请求
     response = await call_next(request)
-    
-    # 记录响应信息
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
-    
-    app_logger.info(f"=== HTTP响应 ===")
-    app_logger.info(f"响应时间: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    app_logger.info(f"响应状态: {response.status_code}")
-    app_logger.info(f"响应头: {dict(response.headers)}")
-    app_logger.info(f"请求耗时: {duration:.3f}秒")
-    app_logger.info(f"---")
-    
+
+    duration = (datetime.now() - start_time).total_seconds()
+    app_logger.info("HTTP响应: %s %s 状态=%s 耗时=%.3f秒", request.method, path, response.status_code, duration)
+    app_logger.debug("响应头: %s", response.headers)
+
     return response
 
 # 创建templates目录
 os.makedirs("templates", exist_ok=True)
 os.makedirs("static", exist_ok=True)
 
-# 挂载静态文件
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/logs", StaticFiles(directory="logs"), name="logs")
+# 是否由应用进程直接伺服静态文件/日志。页面上的日志查看器依赖 /logs，
+# 所以默认开启；生产环境设 SERVE_STATIC_IN_APP=0，交给 nginx/Caddy 等
+# 前置代理用 sendfile 伺服这些目录——尤其 /logs 会把不断增长的日志文件
+# 整个灌进事件循环。
+SERVE_STATIC_IN_APP = os.getenv("SERVE_STATIC_IN_APP", "1") == "1"
+
+if SERVE_STATIC_IN_APP:
+    # check_dir=False 跳过每次请求前的目录存在性检查
+    app.mount("/static", StaticFiles(directory="static", check_dir=False), name="static")
+    app.mount("/logs", StaticFiles(directory="logs", check_dir=False), name="logs")
 
 # 创建Jinja2模板
 templates = Jinja2Templates(directory="templates")
@@ -118,6 +165,17 @@ async def home(request: Request):
     """主页"""
     return templates.TemplateResponse("index.html", {"request": request, "MCP_NAME": MCP_NAME, "MCP_VERSION": MCP_VERSION})
 
+# 工具名 -> (调用目标, 必填参数及缺失提示, 可选参数默认值)
+# 表单字段名与工具方法的形参同名，直接按 kwargs 透传
+TOOL_DISPATCH = {
+    "get_current_time": (mcp_tools.get_current_time, {}, {}),
+    "get_weather": (mcp_tools.get_weather, {}, {"city": "北京"}),
+    "calculate": (mcp_tools.calculate, {"expression": "请输入数学表达式"}, {}),
+    "translate_text": (mcp_tools.translate_text, {"text": "请输入要翻译的文本"}, {"target_lang": "en"}),
+    "get_file_info": (mcp_tools.get_file_info, {"file_path": "请输入文件路径"}, {}),
+    "list_directory": (mcp_tools.list_directory, {}, {"dir_path": "."}),
+}
+
 @app.post("/api/execute_tool")
 async def execute_tool(
     tool_name: str = Form(...),
@@ -130,31 +188,26 @@ async def execute_tool(
 ):
     """执行工具API"""
     try:
-        if tool_name == "get_current_time":
-            result = mcp_tools.get_current_time()
-        elif tool_name == "get_weather":
-            city = city or "北京"
-            result = mcp_tools.get_weather(city)
-        elif tool_name == "calculate":
-            if not expression:
-                return {"success": False, "error": "请输入数学表达式"}
-            result = mcp_tools.calculate(expression)
-        elif tool_name == "translate_text":
-            if not text:
-                return {"success": False, "error": "请输入要翻译的文本"}
-            target_lang = target_lang or "en"
-            result = mcp_tools.translate_text(text, target_lang)
-        elif tool_name == "get_file_info":
-            if not file_path:
-                return {"success": False, "error": "请输入文件路径"}
-            result = mcp_tools.get_file_info(file_path)
-        elif tool_name == "list_directory":
-            dir_path = dir_path or "."
-            result = mcp_tools.list_directory(dir_path)
-        else:
-            result = {"error": f"未知工具: {tool_name}"}
-        
-        return {"success": True, "result": result}
+        entry = TOOL_DISPATCH.get(tool_name)
+        if entry is None:
+            return {"success": True, "result": {"error": f"未知工具: {tool_name}"}}
+        fn, required, defaults = entry
+        form_values = {
+            "city": city,
+            "expression": expression,
+            "text": text,
+            "target_lang": target_lang,
+            "file_path": file_path,
+            "dir_path": dir_path,
+        }
+        kwargs = {}
+        for name, error_msg in required.items():
+            if not form_values.get(name):
+                return {"success": False, "error": error_msg}
+            kwargs[name] = form_values[name]
+        for name, default in defaults.items():
+            kwargs[name] = form_values.get(name) or default
+        return {"success": True, "result": fn(**kwargs)}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -171,6 +224,43 @@ async def api_daily_create(force: bool = Form(False)):
 async def api_daily_read(path: str = None):
     return dt.read_structured(path)
 
+# 聊天记录字节偏移索引：offsets[i] = 第 i 条有效记录的 (起始偏移, 长度)。
+# 本进程是日志唯一写入方且只追加，每次请求只需解析新增的字节。
+_HISTORY_INDEX = {"size": 0, "offsets": []}
+_HISTORY_INDEX_LOCK = threading.Lock()
+
+def _ensure_history_index():
+    """把 CHAT_LOG_PATH 自上次索引以来新追加的记录并入偏移索引。"""
+    try:
+        size = os.path.getsize(CHAT_LOG_PATH)
+    except OSError:
+        _HISTORY_INDEX["size"] = 0
+        _HISTORY_INDEX["offsets"] = []
+        return
+    if size < _HISTORY_INDEX["size"]:
+        # 文件被截断或重建，索引作废重来
+        _HISTORY_INDEX["size"] = 0
+        _HISTORY_INDEX["offsets"] = []
+    if size == _HISTORY_INDEX["size"]:
+        return
+    with open(CHAT_LOG_PATH, "rb") as f:
+        pos = _HISTORY_INDEX["size"]
+        f.seek(pos)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                # 尾行可能写到一半，留到下次再解析
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    obj = _json_loads(line)
+                    if obj.get("role") in ("user", "assistant"):
+                        _HISTORY_INDEX["offsets"].append((pos, len(raw)))
+                except Exception:
+                    pass
+            pos += len(raw)
+        _HISTORY_INDEX["size"] = pos
+
 # 读取历史聊天记录（最近N条）
 @app.get("/api/chat/history")
 async def api_chat_history(limit: int = 50, before: int = None):
@@ -178,33 +268,40 @@ async def api_chat_history(limit: int = 50, before: int = None):
     - limit: 返回条数（默认50）
     - before: 读取在该索引之前的记录（基于0..N-1全量顺序索引）。若未提供，则读取最新limit条。
     返回：history（按时间顺序升序）、next_before（可用于继续向上翻）、total
+
+    借助偏移索引只读取窗口内的字节，分页成本与 limit 成正比，与日志总大小无关。
     """
     try:
-        if not os.path.exists(CHAT_LOG_PATH):
-            return JSONResponse({"success": True, "history": [], "next_before": None, "total": 0})
-        items = []
-        with open(CHAT_LOG_PATH, "r", encoding="utf-8") as f:
-            for line in f:
+        with _HISTORY_INDEX_LOCK:
+            _ensure_history_index()
+            offsets = _HISTORY_INDEX["offsets"]
+            total = len(offsets)
+            if total == 0:
+                return JSONResponse({"success": True, "history": [], "next_before": None, "total": 0})
+            # 计算窗口
+            if before is None:
+                end_idx = total
+            else:
+                end_idx = max(0, min(before, total))
+            start_idx = max(0, end_idx - max(1, limit))
+            window = offsets[start_idx:end_idx]
+        slice_items = []
+        if window:
+            first_off = window[0][0]
+            last_off, last_len = window[-1]
+            with open(CHAT_LOG_PATH, "rb") as f:
+                f.seek(first_off)
+                blob = f.read(last_off + last_len - first_off)
+            for line in blob.split(b"\n"):
                 line = line.strip()
                 if not line:
                     continue
                 try:
-                    obj = json.loads(line)
-                    role = obj.get("role")
-                    if role in ("user", "assistant"):
-                        items.append(obj)
+                    obj = _json_loads(line)
+                    if obj.get("role") in ("user", "assistant"):
+                        slice_items.append(obj)
                 except Exception:
                     continue
-        total = len(items)
-        if total == 0:
-            return JSONResponse({"success": True, "history": [], "next_before": None, "total": 0})
-        # 计算窗口
-        if before is None:
-            end_idx = total
-        else:
-            end_idx = max(0, min(before, total))
-        start_idx = max(0, end_idx - max(1, limit))
-        slice_items = items[start_idx:end_idx]
         next_before = start_idx if start_idx > 0 else None
         return JSONResponse({"success": True, "history": slice_items, "next_before": next_before, "total": total})
     except Exception as e:
@@ -244,7 +341,8 @@ async def api_chat(message: str = Form(...)):
     try:
         # 持久化：记录用户消息
         append_chat_log("user", message)
-        res = mcp_tools.call_openai_api(prompt, max_tokens=300)
+        # LLM 调用是阻塞 I/O，放线程执行，避免挂住整个事件循环
+        res = await asyncio.to_thread(mcp_tools.call_openai_api, prompt, 300)
         
         # 记录响应
         app_logger.info(f"=== 聊天响应 ===")
@@ -278,7 +376,10 @@ async def api_chat_stream(message: str = Form(...)):
     app_logger.info(f"请求路径: /api/chat/stream")
     app_logger.info(f"请求参数: message={message}")
     # 不再拼接系统提示，系统提示由后端工具注入
-    
+
+    # 用户消息在进入流式生成前就落盘：即使客户端中途断开也不会丢
+    append_chat_log("user", message)
+
     def event_gen():
         try:
             full_response = ""
@@ -288,7 +389,7 @@ async def api_chat_stream(message: str = Form(...)):
             for chunk in mcp_tools.stream_openai_api(prompt, max_tokens=600):
                 raw_chunks.append(chunk)
                 full_response += chunk
-                yield f"data: {json.dumps({'delta': chunk}, ensure_ascii=False)}\n\n"
+                yield f"data: {_json_dumps({'delta': chunk})}\n\n"
             
             # 记录完整响应
             app_logger.info(f"=== 流式聊天响应 ===")
@@ -297,8 +398,7 @@ async def api_chat_stream(message: str = Form(...)):
             app_logger.info(f"原始流式数据块: {raw_chunks}")
             app_logger.info(f"完整回复: {full_response}")
             app_logger.info(f"---")
-            # 持久化：记录用户与助手消息
-            append_chat_log("user", message)
+            # 持久化：记录助手消息（用户消息已在请求入口记录）
             append_chat_log("assistant", full_response)
             
         except Exception as e:
@@ -307,7 +407,7 @@ async def api_chat_stream(message: str = Form(...)):
             app_logger.error(f"错误时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             app_logger.error(f"错误信息: {error_msg}")
             app_logger.error(f"---")
-            yield f"data: {json.dumps({'error': error_msg}, ensure_ascii=False)}\n\n"
+            yield f"data: {_json_dumps({'error': error_msg})}\n\n"
         
         yield "data: [DONE]\n\n"
     